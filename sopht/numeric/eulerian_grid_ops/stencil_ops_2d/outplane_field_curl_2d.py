@@ -1,50 +1,109 @@
 """Kernels for computing curl of outplane field in 2D."""
+from numba import njit, prange
+
 import pystencils as ps
 
-from sopht.numeric.eulerian_grid_ops.stencil_ops_2d.elementwise_ops_2d import (
-    gen_set_fixed_val_at_boundaries_pyst_kernel_2d,
+import sympy as sp
+
+from sopht.utils.pyst_kernel_config import (
+    cache_pyst_kernel_generator,
+    get_pyst_dtype,
+    get_pyst_kernel_config,
+    get_pyst_cpu_vectorize_info,
 )
 
-import sympy as sp
 
-from sopht.utils.pyst_kernel_config import get_pyst_dtype, get_pyst_kernel_config
+def _gen_outplane_field_curl_numba_kernel_2d(grid_size_y, grid_size_x, parallel):
+    """Numba outplane field curl kernel for a given grid size.
+
+    The grid size is baked in as a compile time constant, analogous to
+    fixed_grid_size for the pystencils kernels.
+    """
 
+    @njit(parallel=parallel, fastmath=True, boundscheck=False)
+    def outplane_field_curl_numba_kernel_2d(curl_x, curl_y, field, prefactor):
+        for i in prange(1, grid_size_y - 1):
+            for j in range(1, grid_size_x - 1):
+                # curl_x = d (field) / dy
+                curl_x[i, j] = (field[i + 1, j] - field[i - 1, j]) * prefactor
+                # curl_y = -d (field) / dx
+                curl_y[i, j] = (field[i, j - 1] - field[i, j + 1]) * prefactor
 
+    return outplane_field_curl_numba_kernel_2d
+
+
+@cache_pyst_kernel_generator
 def gen_outplane_field_curl_pyst_kernel_2d(
     real_t,
     num_threads=False,
     fixed_grid_size=False,
     reset_ghost_zone=True,
+    backend="pystencils",
 ):
-    """2D Outplane field curl kernel generator."""
+    """2D Outplane field curl kernel generator.
+
+    reset_ghost_zone: if True the kernel also zeros the ghost zone of curl,
+    pass False if curl is allocated zeroed once and its ghost zone is never
+    written to by the caller, to skip the reset on every call.
+    backend: "pystencils" or "numba", for "numba" the curl is computed by
+    numba kernels compiled (and cached) per grid size seen at runtime, which
+    gives shape specialised code even when fixed_grid_size is not known.
+    """
+    assert backend == "pystencils" or backend == "numba", "Invalid backend"
     pyst_dtype = get_pyst_dtype(real_t)
-    kernel_config = get_pyst_kernel_config(real_t, num_threads)
+    # the stencil is only evaluated in the interior, the one cell wide
+    # ghost zone is untouched (and optionally reset to 0 below)
+    kernel_config = get_pyst_kernel_config(
+        real_t,
+        num_threads,
+        cpu_vectorize_info=get_pyst_cpu_vectorize_info(real_t, fixed_grid_size),
+        ghost_layers=1,
+    )
     # we can add dtype checks later
     grid_info = (
         f"{fixed_grid_size[0]}, {fixed_grid_size[1]}" if fixed_grid_size else "2D"
     )
 
     @ps.kernel
-    def _outplane_field_curl_x_stencil_2d():
-        curl_x, field = ps.fields(f"curl_x, field : {pyst_dtype}[{grid_info}]")
+    def _outplane_field_curl_stencil_2d():
+        curl_x, curl_y, field = ps.fields(
+            f"curl_x, curl_y, field : {pyst_dtype}[{grid_info}]"
+        )
         prefactor = sp.symbols("prefactor")
         # curl_x = d (field) / dy
         curl_x[0, 0] @= (field[1, 0] - field[-1, 0]) * prefactor
-
-    _outplane_field_curl_x_pyst_kernel_2d = ps.create_kernel(
-        _outplane_field_curl_x_stencil_2d, config=kernel_config
-    ).compile()
-
-    @ps.kernel
-    def _outplane_field_curl_y_stencil_2d():
-        curl_y, field = ps.fields(f"curl_y, field : {pyst_dtype}[{grid_info}]")
-        prefactor = sp.symbols("prefactor")
         # curl_y = -d (field) / dx
         curl_y[0, 0] @= (field[0, -1] - field[0, 1]) * prefactor
 
-    _outplane_field_curl_y_pyst_kernel_2d = ps.create_kernel(
-        _outplane_field_curl_y_stencil_2d, config=kernel_config
-    ).compile()
+    if backend == "pystencils":
+        _outplane_field_curl_kernel_2d = ps.create_kernel(
+            _outplane_field_curl_stencil_2d, config=kernel_config
+        ).compile()
+    else:
+        _outplane_field_curl_numba_kernels_2d = {}
+
+        def _outplane_field_curl_kernel_2d(curl_x, curl_y, field, prefactor):
+            # numba kernels skip bounds checks, hence check shapes (and fail)
+            # the same way pystencils does, before dispatching on the grid size
+            grid_size = tuple(fixed_grid_size) if fixed_grid_size else field.shape
+            for name, array in (
+                ("curl_x", curl_x),
+                ("curl_y", curl_y),
+                ("field", field),
+            ):
+                if array.shape != grid_size:
+                    if fixed_grid_size:
+                        raise ValueError(f"Wrong shape of array {name}")
+                    raise TypeError("Arrays must have same shape")
+            if grid_size not in _outplane_field_curl_numba_kernels_2d:
+                _outplane_field_curl_numba_kernels_2d[
+                    grid_size
+                ] = _gen_outplane_field_curl_numba_kernel_2d(
+                    *grid_size, parallel=bool(num_threads)
+                )
+            _outplane_field_curl_numba_kernels_2d[grid_size](
+                curl_x, curl_y, field, prefactor
+            )
 
     def outplane_field_curl_pyst_kernel_2d(curl, field, prefactor):
         """Outplane field curl in 2D.
@@ -54,26 +113,29 @@ def gen_outplane_field_curl_pyst_kernel_2d(
         Used for psi ---> velocity
         Assumes curl field is (2, n, n).
         """
-        _outplane_field_curl_x_pyst_kernel_2d(
-            curl_x=curl[0], field=field, prefactor=prefactor
-        )
-        _outplane_field_curl_y_pyst_kernel_2d(
-            curl_y=curl[1], field=field, prefactor=prefactor
+        # both components computed in a single sweep over field
+        _outplane_field_curl_kernel_2d(
+            curl_x=curl[0], curl_y=curl[1], field=field, prefactor=prefactor
         )
 
     if not reset_ghost_zone:
         return outplane_field_curl_pyst_kernel_2d
     else:
-        # to set boundary zone = 0
-        boundary_width = 1
-        set_fixed_val_at_boundaries_2d = gen_set_fixed_val_at_boundaries_pyst_kernel_2d(
-            real_t=real_t,
-            width=boundary_width,
-            # complexity of this operation is O(N), hence setting serial version
-            num_threads=False,
-            field_type="vector",
+        # to set boundary zone = 0, both components are reset together
+        # complexity of this operation is O(N), hence setting serial version
+        ghost_zone_reset_kernel_config = get_pyst_kernel_config(
+            real_t, num_threads=False
         )
 
+        @ps.kernel
+        def _reset_ghost_zone_stencil_2d():
+            vector_field = ps.fields(f"vector_field : {pyst_dtype}[3D]")
+            vector_field[0, 0, 0] @= 0.0
+
+        _reset_ghost_zone_kernel_2d = ps.create_kernel(
+            _reset_ghost_zone_stencil_2d, config=ghost_zone_reset_kernel_config
+        ).compile()
+
         def outplane_field_curl_with_ghost_zone_reset_pyst_kernel_2d(
             curl, field, prefactor
         ):
@@ -88,6 +150,10 @@ def gen_outplane_field_curl_pyst_kernel_2d(
 
             # set boundary unaffected points to 0
             # TODO need one sided corrections?
-            set_fixed_val_at_boundaries_2d(vector_field=curl, fixed_vals=[0, 0])
+            # strided views pick out the first and last rows (and columns),
+            # so that the ghost zone is reset in two kernel calls
+            grid_size_y, grid_size_x = field.shape
+            _reset_ghost_zone_kernel_2d(vector_field=curl[:, :: (grid_size_y - 1), :])
+            _reset_ghost_zone_kernel_2d(vector_field=curl[:, :, :: (grid_size_x - 1)])
 
         return outplane_field_curl_with_ghost_zone_reset_pyst_kernel_2d
@@ -1,11 +1,43 @@
 """Kernels for penalising field boundary in 2D."""
+import functools
+
+from numba import njit, prange
+
 import numpy as np
 
 import pystencils as ps
 
-import sympy as sp
+from sopht.utils.pyst_kernel_config import (
+    get_pyst_broadcast_view,
+    get_pyst_dtype,
+    get_pyst_kernel_config,
+)
+
+
+@functools.lru_cache(maxsize=None)
+def _gen_copy_broadcast_kernels(parallel):
+    """Returns numba kernels broadcasting a column (or row) of a 2D field.
+
+    Compiled once per process for serial and parallel execution each,
+    as the two variants cannot share numba's on-disk cache.
+    """
+
+    @njit(fastmath=True, parallel=parallel)
+    def copy_col_broadcast(field, src_col, dst_start, dst_stop):
+        """Copy column src_col of field into columns [dst_start, dst_stop)."""
+        for i in prange(field.shape[0]):
+            val = field[i, src_col]
+            for j in range(dst_start, dst_stop):
+                field[i, j] = val
+
+    @njit(fastmath=True, parallel=parallel)
+    def copy_row_broadcast(field, src_row, dst_start, dst_stop):
+        """Copy row src_row of field into rows [dst_start, dst_stop)."""
+        for i in prange(dst_start, dst_stop):
+            for j in range(field.shape[1]):
+                field[i, j] = field[src_row, j]
 
-from sopht.utils.pyst_kernel_config import get_pyst_dtype, get_pyst_kernel_config
+    return copy_col_broadcast, copy_row_broadcast
 
 
 def gen_penalise_field_boundary_pyst_kernel_2d(
@@ -29,9 +61,10 @@ def gen_penalise_field_boundary_pyst_kernel_2d(
 
     else:
         pyst_dtype = get_pyst_dtype(real_t)
-        grid_info = (
-            f"{fixed_grid_size[0]}, {fixed_grid_size[1]}" if fixed_grid_size else "2D"
+        _copy_col_broadcast, _copy_row_broadcast = _gen_copy_broadcast_kernels(
+            parallel=bool(num_threads)
         )
+        grid_size_y, grid_size_x = x_grid_field.shape
         x_grid_field_start = x_grid_field[0, 0]
         y_grid_field_start = y_grid_field[0, 0]
         x_grid_field_end = x_grid_field[0, -1]
@@ -39,86 +72,55 @@ def gen_penalise_field_boundary_pyst_kernel_2d(
 
         sine_prefactor = (np.pi / 2) / (width * dx)
 
-        x_front_boundary_slice = ps.make_slice[:, :width]
-        x_front_boundary_kernel_config = get_pyst_kernel_config(
-            real_t,
-            num_threads,
-            iteration_slice=x_front_boundary_slice,
+        # sine taper only varies along the penalised axis, hence precomputed in 1D
+        x_front_boundary_sine_weights = get_pyst_broadcast_view(
+            np.sin(
+                sine_prefactor * (x_grid_field[0, :width] - x_grid_field_start)
+            ).astype(real_t),
+            shape=(grid_size_y, width),
+            axis=1,
         )
-        x_back_boundary_slice = ps.make_slice[:, -width:]
-        x_back_boundary_kernel_config = get_pyst_kernel_config(
-            real_t,
-            num_threads,
-            iteration_slice=x_back_boundary_slice,
+        x_back_boundary_sine_weights = get_pyst_broadcast_view(
+            np.sin(
+                sine_prefactor
+                * (x_grid_field_end - x_grid_field[0, (grid_size_x - width) :])
+            ).astype(real_t),
+            shape=(grid_size_y, width),
+            axis=1,
         )
-
-        @ps.kernel
-        def penalise_field_x_front_boundary_stencil_2d():
-            field, x_grid_field = ps.fields(
-                f"field, x_grid_field : {pyst_dtype}[{grid_info}]"
-            )
-            field[0, 0] @= field[0, 0] * sp.sin(
-                sine_prefactor * (x_grid_field[0, 0] - x_grid_field_start)
-            )
-
-        penalise_field_x_front_boundary_kernel_2d = ps.create_kernel(
-            penalise_field_x_front_boundary_stencil_2d,
-            config=x_front_boundary_kernel_config,
-        ).compile()
-
-        @ps.kernel
-        def penalise_field_x_back_boundary_stencil_2d():
-            field, x_grid_field = ps.fields(
-                f"field, x_grid_field : {pyst_dtype}[{grid_info}]"
-            )
-            field[0, 0] @= field[0, 0] * sp.sin(
-                sine_prefactor * (x_grid_field_end - x_grid_field[0, 0])
-            )
-
-        penalise_field_x_back_boundary_kernel_2d = ps.create_kernel(
-            penalise_field_x_back_boundary_stencil_2d,
-            config=x_back_boundary_kernel_config,
-        ).compile()
-
-        y_front_boundary_slice = ps.make_slice[:width, :]
-        y_front_boundary_kernel_config = get_pyst_kernel_config(
-            real_t,
-            num_threads,
-            iteration_slice=y_front_boundary_slice,
+        y_front_boundary_sine_weights = get_pyst_broadcast_view(
+            np.sin(
+                sine_prefactor * (y_grid_field[:width, 0] - y_grid_field_start)
+            ).astype(real_t),
+            shape=(width, grid_size_x),
+            axis=0,
         )
-        y_back_boundary_slice = ps.make_slice[-width:, :]
-        y_back_boundary_kernel_config = get_pyst_kernel_config(
-            real_t,
-            num_threads,
-            iteration_slice=y_back_boundary_slice,
+        y_back_boundary_sine_weights = get_pyst_broadcast_view(
+            np.sin(
+                sine_prefactor
+                * (y_grid_field_end - y_grid_field[(grid_size_y - width) :, 0])
+            ).astype(real_t),
+            shape=(width, grid_size_x),
+            axis=0,
         )
 
-        @ps.kernel
-        def penalise_field_y_front_boundary_stencil_2d():
-            field, y_grid_field = ps.fields(
-                f"field, y_grid_field : {pyst_dtype}[{grid_info}]"
-            )
-            field[0, 0] @= field[0, 0] * sp.sin(
-                sine_prefactor * (y_grid_field[0, 0] - y_grid_field_start)
-            )
-
-        penalise_field_y_front_boundary_kernel_2d = ps.create_kernel(
-            penalise_field_y_front_boundary_stencil_2d,
-            config=y_front_boundary_kernel_config,
-        ).compile()
+        # boundary zones are strided views of field, hence variable shape
+        kernel_config = get_pyst_kernel_config(real_t, num_threads)
 
+        # front and back zones along a direction are penalised together
         @ps.kernel
-        def penalise_field_y_back_boundary_stencil_2d():
-            field, y_grid_field = ps.fields(
-                f"field, y_grid_field : {pyst_dtype}[{grid_info}]"
+        def _penalise_field_boundary_zones_stencil_2d():
+            field_front, field_back = ps.fields(
+                f"field_front, field_back : {pyst_dtype}[2D]"
             )
-            field[0, 0] @= field[0, 0] * sp.sin(
-                sine_prefactor * (y_grid_field_end - y_grid_field[0, 0])
+            sine_weights_front, sine_weights_back = ps.fields(
+                f"sine_weights_front, sine_weights_back : {pyst_dtype}[2D]"
             )
+            field_front[0, 0] @= field_front[0, 0] * sine_weights_front[0, 0]
+            field_back[0, 0] @= field_back[0, 0] * sine_weights_back[0, 0]
 
-        penalise_field_y_back_boundary_kernel_2d = ps.create_kernel(
-            penalise_field_y_back_boundary_stencil_2d,
-            config=y_back_boundary_kernel_config,
+        penalise_field_boundary_zones_kernel_2d = ps.create_kernel(
+            _penalise_field_boundary_zones_stencil_2d, config=kernel_config
         ).compile()
 
         def penalise_field_boundary_pyst_kernel_2d(field):
@@ -129,25 +131,30 @@ def gen_penalise_field_boundary_pyst_kernel_2d(
             field: field to be penalised
             """
             # first along X
-            # these parts involve broadcasting hence couldn't be pystencilized
-            field[:, :width] = field[:, (width - 1) : width]
-            field[:, -width:] = field[:, -width : (-width + 1)]
-            penalise_field_x_front_boundary_kernel_2d(
-                field=field, x_grid_field=x_grid_field
+            # these parts involve broadcasting hence couldn't be pystencilized,
+            # and are done via numba helpers instead; the source line
+            # is excluded from the destination to avoid an overlapping copy
+            _copy_col_broadcast(field, width - 1, 0, width - 1)
+            _copy_col_broadcast(
+                field, grid_size_x - width, grid_size_x - width + 1, grid_size_x
             )
-            penalise_field_x_back_boundary_kernel_2d(
-                field=field, x_grid_field=x_grid_field
+            penalise_field_boundary_zones_kernel_2d(
+                field_front=field[:, :width],
+                field_back=field[:, (grid_size_x - width) :],
+                sine_weights_front=x_front_boundary_sine_weights,
+                sine_weights_back=x_back_boundary_sine_weights,
             )
 
             # then along Y
-            # these parts involve broadcasting hence couldn't be pystencilized
-            field[:width, :] = field[(width - 1) : width, :]
-            field[-width:, :] = field[-width : (-width + 1), :]
-            penalise_field_y_front_boundary_kernel_2d(
-                field=field, y_grid_field=y_grid_field
+            _copy_row_broadcast(field, width - 1, 0, width - 1)
+            _copy_row_broadcast(
+                field, grid_size_y - width, grid_size_y - width + 1, grid_size_y
             )
-            penalise_field_y_back_boundary_kernel_2d(
-                field=field, y_grid_field=y_grid_field
+            penalise_field_boundary_zones_kernel_2d(
+                field_front=field[:width, :],
+                field_back=field[(grid_size_y - width) :, :],
+                sine_weights_front=y_front_boundary_sine_weights,
+                sine_weights_back=y_back_boundary_sine_weights,
             )
 
     return penalise_field_boundary_pyst_kernel_2d
@@ -3,12 +3,14 @@ import numpy as np
 
 import pystencils as ps
 
-import sympy as sp
+from sopht.utils.pyst_kernel_config import (
+    get_pyst_broadcast_view,
+    get_pyst_dtype,
+    get_pyst_kernel_config,
+)
 
-from sopht.utils.pyst_kernel_config import get_pyst_dtype, get_pyst_kernel_config
 
-
-def gen_penalise_field_boundary_pyst_kernel_3d(  # noqa: C901
+def gen_penalise_field_boundary_pyst_kernel_3d(
     width,
     dx,
     x_grid_field,
@@ -41,11 +43,6 @@ def gen_penalise_field_boundary_pyst_kernel_3d(  # noqa: C901
 
     else:
         pyst_dtype = get_pyst_dtype(real_t)
-        grid_info = (
-            f"{fixed_grid_size[0]}, {fixed_grid_size[1]}, {fixed_grid_size[2]}"
-            if fixed_grid_size
-            else "3D"
-        )
         x_grid_field_start = x_grid_field[0, 0, 0]
         y_grid_field_start = y_grid_field[0, 0, 0]
         z_grid_field_start = z_grid_field[0, 0, 0]
@@ -55,127 +52,71 @@ def gen_penalise_field_boundary_pyst_kernel_3d(  # noqa: C901
 
         sine_prefactor = (np.pi / 2) / (width * dx)
 
-        x_front_boundary_slice = ps.make_slice[:, :, :width]
-        x_front_boundary_kernel_config = get_pyst_kernel_config(
-            real_t,
-            num_threads,
-            iteration_slice=x_front_boundary_slice,
+        # sine taper only varies along the penalised axis, hence precomputed in 1D
+        grid_size_z, grid_size_y, grid_size_x = x_grid_field.shape
+        x_front_boundary_sine_weights = get_pyst_broadcast_view(
+            np.sin(
+                sine_prefactor * (x_grid_field[0, 0, :width] - x_grid_field_start)
+            ).astype(real_t),
+            shape=(grid_size_z, grid_size_y, width),
+            axis=2,
         )
-        x_back_boundary_slice = ps.make_slice[:, :, -width:]
-        x_back_boundary_kernel_config = get_pyst_kernel_config(
-            real_t,
-            num_threads,
-            iteration_slice=x_back_boundary_slice,
+        x_back_boundary_sine_weights = get_pyst_broadcast_view(
+            np.sin(
+                sine_prefactor
+                * (x_grid_field_end - x_grid_field[0, 0, (grid_size_x - width) :])
+            ).astype(real_t),
+            shape=(grid_size_z, grid_size_y, width),
+            axis=2,
         )
-
-        @ps.kernel
-        def penalise_field_x_front_boundary_stencil_3d():
-            field, x_grid_field = ps.fields(
-                f"field, x_grid_field : {pyst_dtype}[{grid_info}]"
-            )
-            field[0, 0, 0] @= field[0, 0, 0] * sp.sin(
-                sine_prefactor * (x_grid_field[0, 0, 0] - x_grid_field_start)
-            )
-
-        penalise_field_x_front_boundary_kernel_3d = ps.create_kernel(
-            penalise_field_x_front_boundary_stencil_3d,
-            config=x_front_boundary_kernel_config,
-        ).compile()
-
-        @ps.kernel
-        def penalise_field_x_back_boundary_stencil_3d():
-            field, x_grid_field = ps.fields(
-                f"field, x_grid_field : {pyst_dtype}[{grid_info}]"
-            )
-            field[0, 0, 0] @= field[0, 0, 0] * sp.sin(
-                sine_prefactor * (x_grid_field_end - x_grid_field[0, 0, 0])
-            )
-
-        penalise_field_x_back_boundary_kernel_3d = ps.create_kernel(
-            penalise_field_x_back_boundary_stencil_3d,
-            config=x_back_boundary_kernel_config,
-        ).compile()
-
-        y_front_boundary_slice = ps.make_slice[:, :width, :]
-        y_front_boundary_kernel_config = get_pyst_kernel_config(
-            real_t,
-            num_threads,
-            iteration_slice=y_front_boundary_slice,
+        y_front_boundary_sine_weights = get_pyst_broadcast_view(
+            np.sin(
+                sine_prefactor * (y_grid_field[0, :width, 0] - y_grid_field_start)
+            ).astype(real_t),
+            shape=(grid_size_z, width, grid_size_x),
+            axis=1,
         )
-        y_back_boundary_slice = ps.make_slice[:, -width:, :]
-        y_back_boundary_kernel_config = get_pyst_kernel_config(
-            real_t,
-            num_threads,
-            iteration_slice=y_back_boundary_slice,
+        y_back_boundary_sine_weights = get_pyst_broadcast_view(
+            np.sin(
+                sine_prefactor
+                * (y_grid_field_end - y_grid_field[0, (grid_size_y - width) :, 0])
+            ).astype(real_t),
+            shape=(grid_size_z, width, grid_size_x),
+            axis=1,
         )
-
-        @ps.kernel
-        def penalise_field_y_front_boundary_stencil_3d():
-            field, y_grid_field = ps.fields(
-                f"field, y_grid_field : {pyst_dtype}[{grid_info}]"
-            )
-            field[0, 0, 0] @= field[0, 0, 0] * sp.sin(
-                sine_prefactor * (y_grid_field[0, 0, 0] - y_grid_field_start)
-            )
-
-        penalise_field_y_front_boundary_kernel_3d = ps.create_kernel(
-            penalise_field_y_front_boundary_stencil_3d,
-            config=y_front_boundary_kernel_config,
-        ).compile()
-
-        @ps.kernel
-        def penalise_field_y_back_boundary_stencil_3d():
-            field, y_grid_field = ps.fields(
-                f"field, y_grid_field : {pyst_dtype}[{grid_info}]"
-            )
-            field[0, 0, 0] @= field[0, 0, 0] * sp.sin(
-                sine_prefactor * (y_grid_field_end - y_grid_field[0, 0, 0])
-            )
-
-        penalise_field_y_back_boundary_kernel_3d = ps.create_kernel(
-            penalise_field_y_back_boundary_stencil_3d,
-            config=y_back_boundary_kernel_config,
-        ).compile()
-
-        z_front_boundary_slice = ps.make_slice[:width, :, :]
-        z_front_boundary_kernel_config = get_pyst_kernel_config(
-            real_t,
-            num_threads,
-            iteration_slice=z_front_boundary_slice,
+        z_front_boundary_sine_weights = get_pyst_broadcast_view(
+            np.sin(
+                sine_prefactor * (z_grid_field[:width, 0, 0] - z_grid_field_start)
+            ).astype(real_t),
+            shape=(width, grid_size_y, grid_size_x),
+            axis=0,
         )
-        z_back_boundary_slice = ps.make_slice[-width:, :, :]
-        z_back_boundary_kernel_config = get_pyst_kernel_config(
-            real_t,
-            num_threads,
-            iteration_slice=z_back_boundary_slice,
+        z_back_boundary_sine_weights = get_pyst_broadcast_view(
+            np.sin(
+                sine_prefactor
+                * (z_grid_field_end - z_grid_field[(grid_size_z - width) :, 0, 0])
+            ).astype(real_t),
+            shape=(width, grid_size_y, grid_size_x),
+            axis=0,
         )
 
-        @ps.kernel
-        def penalise_field_z_front_boundary_stencil_3d():
-            field, z_grid_field = ps.fields(
-                f"field, z_grid_field : {pyst_dtype}[{grid_info}]"
-            )
-            field[0, 0, 0] @= field[0, 0, 0] * sp.sin(
-                sine_prefactor * (z_grid_field[0, 0, 0] - z_grid_field_start)
-            )
-
-        penalise_field_z_front_boundary_kernel_3d = ps.create_kernel(
-            penalise_field_z_front_boundary_stencil_3d,
-            config=z_front_boundary_kernel_config,
-        ).compile()
+        # boundary zones are strided views of field, hence variable shape
+        kernel_config = get_pyst_kernel_config(real_t, num_threads)
 
+        # front and back zones along a direction are penalised together
         @ps.kernel
-        def penalise_field_z_back_boundary_stencil_3d():
-            field, z_grid_field = ps.fields(
-                f"field, z_grid_field : {pyst_dtype}[{grid_info}]"
+        def _penalise_field_boundary_zones_stencil_3d():
+            field_front, field_back = ps.fields(
+                f"field_front, field_back : {pyst_dtype}[3D]"
             )
-            field[0, 0, 0] @= field[0, 0, 0] * sp.sin(
-                sine_prefactor * (z_grid_field_end - z_grid_field[0, 0, 0])
+            sine_weights_front, sine_weights_back = ps.fields(
+                f"sine_weights_front, sine_weights_back : {pyst_dtype}[3D]"
             )
+            field_front[0, 0, 0] @= field_front[0, 0, 0] * sine_weights_front[0, 0, 0]
+            field_back[0, 0, 0] @= field_back[0, 0, 0] * sine_weights_back[0, 0, 0]
 
-        penalise_field_z_back_boundary_kernel_3d = ps.create_kernel(
-            penalise_field_z_back_boundary_stencil_3d,
-            config=z_back_boundary_kernel_config,
+        penalise_field_boundary_zones_kernel_3d = ps.create_kernel(
+            _penalise_field_boundary_zones_stencil_3d, config=kernel_config
         ).compile()
 
         def penalise_field_boundary_pyst_kernel_3d(field):
@@ -188,34 +129,40 @@ def gen_penalise_field_boundary_pyst_kernel_3d(  # noqa: C901
             # first along X
             # these parts involve broadcasting hence couldn't be pystencilized
             field[:, :, :width] = field[:, :, (width - 1) : width]
-            field[:, :, -width:] = field[:, :, -width : (-width + 1)]
-            penalise_field_x_front_boundary_kernel_3d(
-                field=field, x_grid_field=x_grid_field
-            )
-            penalise_field_x_back_boundary_kernel_3d(
-                field=field, x_grid_field=x_grid_field
+            field[:, :, (grid_size_x - width) :] = field[
+                :, :, (grid_size_x - width) : (grid_size_x - width + 1)
+            ]
+            penalise_field_boundary_zones_kernel_3d(
+                field_front=field[:, :, :width],
+                field_back=field[:, :, (grid_size_x - width) :],
+                sine_weights_front=x_front_boundary_sine_weights,
+                sine_weights_back=x_back_boundary_sine_weights,
             )
 
             # then along Y
             # these parts involve broadcasting hence couldn't be pystencilized
             field[:, :width, :] = field[:, (width - 1) : width, :]
-            field[:, -width:, :] = field[:, -width : (-width + 1), :]
-            penalise_field_y_front_boundary_kernel_3d(
-                field=field, y_grid_field=y_grid_field
-            )
-            penalise_field_y_back_boundary_kernel_3d(
-                field=field, y_grid_field=y_grid_field
+            field[:, (grid_size_y - width) :, :] = field[
+                :, (grid_size_y - width) : (grid_size_y - width + 1), :
+            ]
+            penalise_field_boundary_zones_kernel_3d(
+                field_front=field[:, :width, :],
+                field_back=field[:, (grid_size_y - width) :, :],
+                sine_weights_front=y_front_boundary_sine_weights,
+                sine_weights_back=y_back_boundary_sine_weights,
             )
 
             # then along Z
             # these parts involve broadcasting hence couldn't be pystencilized
             field[:width, :, :] = field[(width - 1) : width, :, :]
-            field[-width:, :, :] = field[-width : (-width + 1), :, :]
-            penalise_field_z_front_boundary_kernel_3d(
-                field=field, z_grid_field=z_grid_field
-            )
-            penalise_field_z_back_boundary_kernel_3d(
-                field=field, z_grid_field=z_grid_field
+            field[(grid_size_z - width) :, :, :] = field[
+                (grid_size_z - width) : (grid_size_z - width + 1), :, :
+            ]
+            penalise_field_boundary_zones_kernel_3d(
+                field_front=field[:width, :, :],
+                field_back=field[(grid_size_z - width) :, :, :],
+                sine_weights_front=z_front_boundary_sine_weights,
+                sine_weights_back=z_back_boundary_sine_weights,
             )
 
         if field_type == "scalar":
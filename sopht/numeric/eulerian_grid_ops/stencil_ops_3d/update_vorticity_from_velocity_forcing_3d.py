@@ -1,18 +1,122 @@
 """Kernels for updating vorticity based on velocity forcing in 3D."""
+from numba import njit, prange
+
 import pystencils as ps
 
 import sympy as sp
 
-from sopht.utils.pyst_kernel_config import get_pyst_dtype, get_pyst_kernel_config
+from sopht.utils.pyst_kernel_config import (
+    cache_pyst_kernel_generator,
+    create_pyst_kernel_with_omp_schedule,
+    get_pyst_dtype,
+    get_pyst_kernel_config,
+    get_pyst_cpu_vectorize_info,
+    get_pyst_gpu_kernel_config,
+)
+
+
+def _gen_update_vorticity_from_velocity_forcing_numba_kernel_3d(
+    grid_size_z, grid_size_y, grid_size_x, parallel
+):
+    """Numba update vorticity based on velocity forcing kernel for a grid size.
+
+    The grid size is baked in as a compile time constant, analogous to
+    fixed_grid_size for the pystencils kernels.
+    """
+
+    @njit(parallel=parallel, fastmath=True, boundscheck=False)
+    def update_vorticity_from_velocity_forcing_numba_kernel_3d(
+        vorticity_field_x,
+        vorticity_field_y,
+        vorticity_field_z,
+        velocity_forcing_field_x,
+        velocity_forcing_field_y,
+        velocity_forcing_field_z,
+        prefactor,
+    ):
+        for k in prange(1, grid_size_z - 1):
+            for j in range(1, grid_size_y - 1):
+                for i in range(1, grid_size_x - 1):
+                    # curl_x = df_z / dy - df_y / dz
+                    vorticity_field_x[k, j, i] += prefactor * (
+                        velocity_forcing_field_z[k, j + 1, i]
+                        - velocity_forcing_field_z[k, j - 1, i]
+                        - velocity_forcing_field_y[k + 1, j, i]
+                        + velocity_forcing_field_y[k - 1, j, i]
+                    )
+                    # curl_y = df_x / dz - df_z / dx
+                    vorticity_field_y[k, j, i] += prefactor * (
+                        velocity_forcing_field_x[k + 1, j, i]
+                        - velocity_forcing_field_x[k - 1, j, i]
+                        - velocity_forcing_field_z[k, j, i + 1]
+                        + velocity_forcing_field_z[k, j, i - 1]
+                    )
+                    # curl_z = df_y / dx - df_x / dy
+                    vorticity_field_z[k, j, i] += prefactor * (
+                        velocity_forcing_field_y[k, j, i + 1]
+                        - velocity_forcing_field_y[k, j, i - 1]
+                        - velocity_forcing_field_x[k, j + 1, i]
+                        + velocity_forcing_field_x[k, j - 1, i]
+                    )
+
+    return update_vorticity_from_velocity_forcing_numba_kernel_3d
 
 
+@cache_pyst_kernel_generator
 def gen_update_vorticity_from_velocity_forcing_pyst_kernel_3d(
-    real_t, num_threads=False, fixed_grid_size=False
+    real_t,
+    num_threads=False,
+    fixed_grid_size=False,
+    cache_blocking=(16, 16, 0),
+    schedule_policy="static,1",
+    target="cpu",
+    field_layout="vector",
+    backend="pystencils",
 ):
     # TODO expand docs
-    """Update vorticity based on velocity forcing in 3D kernel generator."""
+    """Update vorticity based on velocity forcing in 3D kernel generator.
+
+    cache_blocking: block sizes along (z, y, x) for spatial cache blocking,
+    x is left unblocked by default to keep the innermost loop contiguous.
+    Tune (z, y) block sizes to the cache size of the target machine,
+    pass None to disable blocking.
+    schedule_policy: OpenMP schedule for the outer (block) loop, round robin
+    by default so that neighbouring threads share planes in cache. For good
+    NUMA locality the fields should be first touched (initialised) in
+    parallel with the same thread layout.
+    target: "cpu" or "gpu", for "gpu" the kernel runs via CUDA on pycuda
+    GPUArrays, and the CPU specific options above are ignored.
+    field_layout: "vector" for kernels taking (3, n, n, n) vector fields,
+    or "component" for kernels taking the x, y, z components as separately
+    allocated (n, n, n) fields. Either way components are stored as a
+    struct of arrays, i.e. each component is contiguous with unit stride
+    along x; interleaved (n, n, n, 3) fields are not supported.
+    backend: "pystencils" or "numba", for "numba" (CPU only) the update is
+    done by numba kernels compiled (and cached) per grid size seen at
+    runtime, which gives shape specialised code even when fixed_grid_size
+    is not known; cache_blocking and schedule_policy are then ignored.
+    """
+    assert target == "cpu" or target == "gpu", "Invalid target"
+    assert backend == "pystencils" or backend == "numba", "Invalid backend"
+    assert not (
+        backend == "numba" and target == "gpu"
+    ), "numba backend supports only cpu target"
+    assert (
+        field_layout == "vector" or field_layout == "component"
+    ), "Invalid field layout"
     pyst_dtype = get_pyst_dtype(real_t)
-    kernel_config = get_pyst_kernel_config(real_t, num_threads)
+    if target == "gpu":
+        kernel_config = get_pyst_gpu_kernel_config(real_t)
+    else:
+        kernel_config = get_pyst_kernel_config(
+            real_t,
+            num_threads,
+            cpu_blocking=cache_blocking,
+            cpu_vectorize_info=get_pyst_cpu_vectorize_info(
+                real_t, fixed_grid_size, cpu_blocking=cache_blocking
+            ),
+            ghost_layers=1,
+        )
     # we can add dtype checks later
     grid_info = (
         f"{fixed_grid_size[0]}, {fixed_grid_size[1]}, {fixed_grid_size[2]}"
@@ -21,16 +125,24 @@ def gen_update_vorticity_from_velocity_forcing_pyst_kernel_3d(
     )
 
     @ps.kernel
-    def _update_vorticity_from_velocity_forcing_x_comp_stencil_3d():
+    def _update_vorticity_from_velocity_forcing_stencil_3d():
+        vorticity_field_x, vorticity_field_y, vorticity_field_z = ps.fields(
+            f"vorticity_field_x, vorticity_field_y, "
+            f"vorticity_field_z : {pyst_dtype}[{grid_info}]"
+        )
         (
-            vorticity_field_x,
+            velocity_forcing_field_x,
             velocity_forcing_field_y,
             velocity_forcing_field_z,
         ) = ps.fields(
-            f"vorticity_field_x, velocity_forcing_field_y, "
+            f"velocity_forcing_field_x, velocity_forcing_field_y, "
             f"velocity_forcing_field_z : {pyst_dtype}[{grid_info}]"
         )
         prefactor = sp.symbols("prefactor")
+        # NOTE: the accumulation below is kept in factored form; pystencils
+        # compiles with -Ofast -march=native, which already contracts the
+        # final multiply-add into a single FMA per component, and distributing
+        # prefactor over the differences yields identical machine code.
         # curl_x = df_z / dy - df_y / dz
         vorticity_field_x[0, 0, 0] @= vorticity_field_x[0, 0, 0] + prefactor * (
             velocity_forcing_field_z[0, 1, 0]
@@ -38,22 +150,6 @@ def gen_update_vorticity_from_velocity_forcing_pyst_kernel_3d(
             - velocity_forcing_field_y[1, 0, 0]
             + velocity_forcing_field_y[-1, 0, 0]
         )
-
-    _update_vorticity_from_velocity_forcing_x_comp_kernel_3d = ps.create_kernel(
-        _update_vorticity_from_velocity_forcing_x_comp_stencil_3d, config=kernel_config
-    ).compile()
-
-    @ps.kernel
-    def _update_vorticity_from_velocity_forcing_y_comp_stencil_3d():
-        (
-            vorticity_field_y,
-            velocity_forcing_field_x,
-            velocity_forcing_field_z,
-        ) = ps.fields(
-            f"vorticity_field_y, velocity_forcing_field_x,"
-            f" velocity_forcing_field_z : {pyst_dtype}[{grid_info}]"
-        )
-        prefactor = sp.symbols("prefactor")
         # curl_y = df_x / dz - df_z / dx
         vorticity_field_y[0, 0, 0] @= vorticity_field_y[0, 0, 0] + prefactor * (
             velocity_forcing_field_x[1, 0, 0]
@@ -61,23 +157,6 @@ def gen_update_vorticity_from_velocity_forcing_pyst_kernel_3d(
             - velocity_forcing_field_z[0, 0, 1]
             + velocity_forcing_field_z[0, 0, -1]
         )
-
-    _update_vorticity_from_velocity_forcing_y_comp_kernel_3d = ps.create_kernel(
-        _update_vorticity_from_velocity_forcing_y_comp_stencil_3d, config=kernel_config
-    ).compile()
-
-    @ps.kernel
-    def _update_vorticity_from_velocity_forcing_z_comp_stencil_3d():
-        (
-            vorticity_field_z,
-            velocity_forcing_field_x,
-            velocity_forcing_field_y,
-        ) = ps.fields(
-            f"vorticity_field_z, velocity_forcing_field_x,"
-            f" velocity_forcing_field_y : {pyst_dtype}[{grid_info}]"
-        )
-        ""
-        prefactor = sp.symbols("prefactor")
         # curl_z = df_y / dx - df_x / dy
         vorticity_field_z[0, 0, 0] @= vorticity_field_z[0, 0, 0] + prefactor * (
             velocity_forcing_field_y[0, 0, 1]
@@ -86,9 +165,96 @@ def gen_update_vorticity_from_velocity_forcing_pyst_kernel_3d(
             + velocity_forcing_field_x[0, -1, 0]
         )
 
-    _update_vorticity_from_velocity_forcing_z_comp_kernel_3d = ps.create_kernel(
-        _update_vorticity_from_velocity_forcing_z_comp_stencil_3d, config=kernel_config
-    ).compile()
+    if backend == "numba":
+        _update_vorticity_from_velocity_forcing_numba_kernels_3d = {}
+
+        def _update_vorticity_from_velocity_forcing_kernel_3d(
+            vorticity_field_x,
+            vorticity_field_y,
+            vorticity_field_z,
+            velocity_forcing_field_x,
+            velocity_forcing_field_y,
+            velocity_forcing_field_z,
+            prefactor,
+        ):
+            # numba kernels skip bounds checks, hence check shapes (and fail)
+            # the same way pystencils does, before dispatching on the grid size
+            grid_size = (
+                tuple(fixed_grid_size) if fixed_grid_size else vorticity_field_x.shape
+            )
+            for name, array in (
+                ("vorticity_field_x", vorticity_field_x),
+                ("vorticity_field_y", vorticity_field_y),
+                ("vorticity_field_z", vorticity_field_z),
+                ("velocity_forcing_field_x", velocity_forcing_field_x),
+                ("velocity_forcing_field_y", velocity_forcing_field_y),
+                ("velocity_forcing_field_z", velocity_forcing_field_z),
+            ):
+                if array.shape != grid_size:
+                    if fixed_grid_size:
+                        raise ValueError(f"Wrong shape of array {name}")
+                    raise TypeError("Arrays must have same shape")
+            if (
+                grid_size
+                not in _update_vorticity_from_velocity_forcing_numba_kernels_3d
+            ):
+                _update_vorticity_from_velocity_forcing_numba_kernels_3d[
+                    grid_size
+                ] = _gen_update_vorticity_from_velocity_forcing_numba_kernel_3d(
+                    *grid_size, parallel=bool(num_threads)
+                )
+            _update_vorticity_from_velocity_forcing_numba_kernels_3d[grid_size](
+                vorticity_field_x,
+                vorticity_field_y,
+                vorticity_field_z,
+                velocity_forcing_field_x,
+                velocity_forcing_field_y,
+                velocity_forcing_field_z,
+                prefactor,
+            )
+
+    elif target == "gpu":
+        _update_vorticity_from_velocity_forcing_kernel_3d = ps.create_kernel(
+            _update_vorticity_from_velocity_forcing_stencil_3d, config=kernel_config
+        ).compile()
+    else:
+        _update_vorticity_from_velocity_forcing_kernel_3d = (
+            create_pyst_kernel_with_omp_schedule(
+                _update_vorticity_from_velocity_forcing_stencil_3d,
+                kernel_config=kernel_config,
+                omp_schedule=schedule_policy,
+            ).compile()
+        )
+
+    def component_update_vorticity_from_velocity_forcing_pyst_kernel_3d(
+        vorticity_field_x,
+        vorticity_field_y,
+        vorticity_field_z,
+        velocity_forcing_field_x,
+        velocity_forcing_field_y,
+        velocity_forcing_field_z,
+        prefactor,
+    ):
+        """Kernel for updating vorticity based on velocity forcing in 3D.
+
+        Updates vorticity_field based on velocity_forcing_field
+        vorticity_field += prefactor * curl(velocity_forcing_field)
+        prefactor: grid spacing factored out, along with any other multiplier
+        Takes the vector field components as separate (n, n, n) fields.
+        """
+        # all three components updated in a single sweep over the forcing field
+        _update_vorticity_from_velocity_forcing_kernel_3d(
+            vorticity_field_x=vorticity_field_x,
+            vorticity_field_y=vorticity_field_y,
+            vorticity_field_z=vorticity_field_z,
+            velocity_forcing_field_x=velocity_forcing_field_x,
+            velocity_forcing_field_y=velocity_forcing_field_y,
+            velocity_forcing_field_z=velocity_forcing_field_z,
+            prefactor=prefactor,
+        )
+
+    if field_layout == "component":
+        return component_update_vorticity_from_velocity_forcing_pyst_kernel_3d
 
     def update_vorticity_from_velocity_forcing_pyst_kernel_3d(
         vorticity_field, velocity_forcing_field, prefactor
@@ -100,35 +266,49 @@ def gen_update_vorticity_from_velocity_forcing_pyst_kernel_3d(
         prefactor: grid spacing factored out, along with any other multiplier
         Assumes velocity_forcing_field is (3, n, n).
         """
-        _update_vorticity_from_velocity_forcing_x_comp_kernel_3d(
-            vorticity_field_x=vorticity_field[0],
-            velocity_forcing_field_y=velocity_forcing_field[1],
-            velocity_forcing_field_z=velocity_forcing_field[2],
-            prefactor=prefactor,
-        )
-        _update_vorticity_from_velocity_forcing_y_comp_kernel_3d(
-            vorticity_field_y=vorticity_field[1],
-            velocity_forcing_field_x=velocity_forcing_field[0],
-            velocity_forcing_field_z=velocity_forcing_field[2],
-            prefactor=prefactor,
-        )
-        _update_vorticity_from_velocity_forcing_z_comp_kernel_3d(
-            vorticity_field_z=vorticity_field[2],
-            velocity_forcing_field_x=velocity_forcing_field[0],
-            velocity_forcing_field_y=velocity_forcing_field[1],
-            prefactor=prefactor,
+        component_update_vorticity_from_velocity_forcing_pyst_kernel_3d(
+            vorticity_field[0],
+            vorticity_field[1],
+            vorticity_field[2],
+            velocity_forcing_field[0],
+            velocity_forcing_field[1],
+            velocity_forcing_field[2],
+            prefactor,
         )
 
     return update_vorticity_from_velocity_forcing_pyst_kernel_3d
 
 
+@cache_pyst_kernel_generator
 def gen_update_vorticity_from_penalised_velocity_pyst_kernel_3d(
-    real_t, num_threads=False, fixed_grid_size=False
+    real_t,
+    num_threads=False,
+    fixed_grid_size=False,
+    cache_blocking=(16, 16, 0),
+    schedule_policy="static,1",
 ):
     # TODO expand docs
-    """Update vorticity based on penalised velocity in 3D kernel generator."""
+    """Update vorticity based on penalised velocity in 3D kernel generator.
+
+    cache_blocking: block sizes along (z, y, x) for spatial cache blocking,
+    x is left unblocked by default to keep the innermost loop contiguous.
+    Tune (z, y) block sizes to the cache size of the target machine,
+    pass None to disable blocking.
+    schedule_policy: OpenMP schedule for the outer (block) loop, round robin
+    by default so that neighbouring threads share planes in cache. For good
+    NUMA locality the fields should be first touched (initialised) in
+    parallel with the same thread layout.
+    """
     pyst_dtype = get_pyst_dtype(real_t)
-    kernel_config = get_pyst_kernel_config(real_t, num_threads)
+    kernel_config = get_pyst_kernel_config(
+        real_t,
+        num_threads,
+        cpu_blocking=cache_blocking,
+        cpu_vectorize_info=get_pyst_cpu_vectorize_info(
+            real_t, fixed_grid_size, cpu_blocking=cache_blocking
+        ),
+        ghost_layers=1,
+    )
     # we can add dtype checks later
     grid_info = (
         f"{fixed_grid_size[0]}, {fixed_grid_size[1]}, {fixed_grid_size[2]}"
@@ -137,13 +317,21 @@ def gen_update_vorticity_from_penalised_velocity_pyst_kernel_3d(
     )
 
     @ps.kernel
-    def _update_vorticity_from_penalised_velocity_x_comp_stencil_3d():
-        (vorticity_field_x, velocity_field_y, velocity_field_z,) = ps.fields(
-            f"vorticity_field_x, velocity_field_y, "
+    def _update_vorticity_from_penalised_velocity_stencil_3d():
+        vorticity_field_x, vorticity_field_y, vorticity_field_z = ps.fields(
+            f"vorticity_field_x, vorticity_field_y, "
+            f"vorticity_field_z : {pyst_dtype}[{grid_info}]"
+        )
+        velocity_field_x, velocity_field_y, velocity_field_z = ps.fields(
+            f"velocity_field_x, velocity_field_y, "
             f"velocity_field_z : {pyst_dtype}[{grid_info}]"
         )
-        (penalised_velocity_field_y, penalised_velocity_field_z,) = ps.fields(
-            f"penalised_velocity_field_y, "
+        (
+            penalised_velocity_field_x,
+            penalised_velocity_field_y,
+            penalised_velocity_field_z,
+        ) = ps.fields(
+            f"penalised_velocity_field_x, penalised_velocity_field_y, "
             f"penalised_velocity_field_z : {pyst_dtype}[{grid_info}]"
         )
         prefactor = sp.symbols("prefactor")
@@ -158,23 +346,6 @@ def gen_update_vorticity_from_penalised_velocity_pyst_kernel_3d(
             + penalised_velocity_field_y[-1, 0, 0]
             - velocity_field_y[-1, 0, 0]
         )
-
-    _update_vorticity_from_penalised_velocity_x_comp_kernel_3d = ps.create_kernel(
-        _update_vorticity_from_penalised_velocity_x_comp_stencil_3d,
-        config=kernel_config,
-    ).compile()
-
-    @ps.kernel
-    def _update_vorticity_from_penalised_velocity_y_comp_stencil_3d():
-        (vorticity_field_y, velocity_field_x, velocity_field_z,) = ps.fields(
-            f"vorticity_field_y, velocity_field_x,"
-            f" velocity_field_z : {pyst_dtype}[{grid_info}]"
-        )
-        (penalised_velocity_field_x, penalised_velocity_field_z,) = ps.fields(
-            f"penalised_velocity_field_x, "
-            f"penalised_velocity_field_z : {pyst_dtype}[{grid_info}]"
-        )
-        prefactor = sp.symbols("prefactor")
         # curl_y = df_x / dz - df_z / dx
         vorticity_field_y[0, 0, 0] @= vorticity_field_y[0, 0, 0] + prefactor * (
             penalised_velocity_field_x[1, 0, 0]
@@ -186,23 +357,6 @@ def gen_update_vorticity_from_penalised_velocity_pyst_kernel_3d(
             + penalised_velocity_field_z[0, 0, -1]
             - velocity_field_z[0, 0, -1]
         )
-
-    _update_vorticity_from_penalised_velocity_y_comp_kernel_3d = ps.create_kernel(
-        _update_vorticity_from_penalised_velocity_y_comp_stencil_3d,
-        config=kernel_config,
-    ).compile()
-
-    @ps.kernel
-    def _update_vorticity_from_penalised_velocity_z_comp_stencil_3d():
-        (vorticity_field_z, velocity_field_x, velocity_field_y,) = ps.fields(
-            f"vorticity_field_z, velocity_field_x,"
-            f" velocity_field_y : {pyst_dtype}[{grid_info}]"
-        )
-        (penalised_velocity_field_x, penalised_velocity_field_y,) = ps.fields(
-            f"penalised_velocity_field_x, "
-            f"penalised_velocity_field_y : {pyst_dtype}[{grid_info}]"
-        )
-        prefactor = sp.symbols("prefactor")
         # curl_z = df_y / dx - df_x / dy
         vorticity_field_z[0, 0, 0] @= vorticity_field_z[0, 0, 0] + prefactor * (
             penalised_velocity_field_y[0, 0, 1]
@@ -215,10 +369,13 @@ def gen_update_vorticity_from_penalised_velocity_pyst_kernel_3d(
             - velocity_field_x[0, -1, 0]
         )
 
-    _update_vorticity_from_penalised_velocity_z_comp_kernel_3d = ps.create_kernel(
-        _update_vorticity_from_penalised_velocity_z_comp_stencil_3d,
-        config=kernel_config,
-    ).compile()
+    _update_vorticity_from_penalised_velocity_kernel_3d = (
+        create_pyst_kernel_with_omp_schedule(
+            _update_vorticity_from_penalised_velocity_stencil_3d,
+            kernel_config=kernel_config,
+            omp_schedule=schedule_policy,
+        ).compile()
+    )
 
     def update_vorticity_from_penalised_velocity_kernel_3d(
         vorticity_field,
@@ -233,28 +390,17 @@ def gen_update_vorticity_from_penalised_velocity_pyst_kernel_3d(
         prefactor: grid spacing factored out, along with any other multiplier
         Assumes velocity_field is (3, n, n).
         """
-        _update_vorticity_from_penalised_velocity_x_comp_kernel_3d(
+        # all three components updated in a single sweep over the velocity fields
+        _update_vorticity_from_penalised_velocity_kernel_3d(
             vorticity_field_x=vorticity_field[0],
-            penalised_velocity_field_y=penalised_velocity_field[1],
-            penalised_velocity_field_z=penalised_velocity_field[2],
-            velocity_field_y=velocity_field[1],
-            velocity_field_z=velocity_field[2],
-            prefactor=prefactor,
-        )
-        _update_vorticity_from_penalised_velocity_y_comp_kernel_3d(
             vorticity_field_y=vorticity_field[1],
-            penalised_velocity_field_x=penalised_velocity_field[0],
-            penalised_velocity_field_z=penalised_velocity_field[2],
-            velocity_field_x=velocity_field[0],
-            velocity_field_z=velocity_field[2],
-            prefactor=prefactor,
-        )
-        _update_vorticity_from_penalised_velocity_z_comp_kernel_3d(
             vorticity_field_z=vorticity_field[2],
             penalised_velocity_field_x=penalised_velocity_field[0],
             penalised_velocity_field_y=penalised_velocity_field[1],
+            penalised_velocity_field_z=penalised_velocity_field[2],
             velocity_field_x=velocity_field[0],
             velocity_field_y=velocity_field[1],
+            velocity_field_z=velocity_field[2],
             prefactor=prefactor,
         )
 
@@ -1,6 +1,13 @@
+import dataclasses
+import functools
 import numpy as np
 import pystencils as ps
-from typing import Tuple, Type
+from pystencils.cpu import add_openmp
+from pystencils.backends.simd_instruction_sets import (
+    get_supported_instruction_sets,
+    get_vector_instruction_set,
+)
+from typing import Callable, Dict, Tuple, Type
 
 
 def get_pyst_dtype(real_t: Type) -> str:
@@ -14,10 +21,23 @@ def get_pyst_dtype(real_t: Type) -> str:
 
 
 def get_pyst_kernel_config(
-    real_t: Type, num_threads: int, iteration_slice: Tuple = None
+    real_t: Type,
+    num_threads: int,
+    iteration_slice: Tuple = None,
+    cpu_blocking: Tuple = None,
+    cpu_vectorize_info: Dict = None,
+    ghost_layers: int = None,
 ):
     """Returns the pystencils kernel config based on the data
-    dtype and number of threads"""
+    dtype and number of threads.
+
+    cpu_blocking: optional block sizes along each array axis for
+    spatial cache blocking, 0 along an axis disables blocking there.
+    cpu_vectorize_info: optional explicit SIMD vectorization options,
+    see get_pyst_cpu_vectorize_info.
+    ghost_layers: optional number of boundary layers skipped by the kernel,
+    inferred by pystencils from the stencil extent by default.
+    """
     pyst_dtype = get_pyst_dtype(real_t)
     # TODO check out more options here!
     kernel_config = ps.CreateKernelConfig(
@@ -25,5 +45,154 @@ def get_pyst_kernel_config(
         default_number_float=pyst_dtype,
         cpu_openmp=num_threads,
         iteration_slice=iteration_slice,
+        cpu_blocking=cpu_blocking,
+        cpu_vectorize_info=cpu_vectorize_info,
+        ghost_layers=ghost_layers,
     )
     return kernel_config
+
+
+def get_pyst_gpu_kernel_config(real_t: Type, block_size: Tuple = (1, 1, 64)):
+    """Returns the pystencils GPU (CUDA) kernel config based on the data
+    dtype and CUDA block size.
+
+    block_size: threads per block. pystencils permutes the entries such
+    that the largest one lies along the fastest (x) array axis, and maps
+    array axis i to threadIdx[i], hence for our (z, y, x) fields x lies on
+    threadIdx.z, where CUDA caps the block size at 64 (e.g. (128, 2, 2)
+    is launched as (2, 2, 64)). Since warps are formed along threadIdx.x
+    first, they cover contiguous x only when the other entries are 1,
+    hence the default (1, 1, 64), i.e. warps of 32 contiguous x elements.
+    GPU kernels are compiled and launched via pycuda, and hence expect
+    pycuda GPUArrays as inputs.
+    """
+    pyst_dtype = get_pyst_dtype(real_t)
+    kernel_config = ps.CreateKernelConfig(
+        target=ps.Target.GPU,
+        data_type=pyst_dtype,
+        default_number_float=pyst_dtype,
+        gpu_indexing_params={"block_size": block_size},
+    )
+    return kernel_config
+
+
+def get_pyst_broadcast_view(array_1d: np.ndarray, shape: Tuple, axis: int):
+    """Returns a zero-stride view of array_1d along axis, broadcast to shape.
+
+    Unlike np.broadcast_to the view is writeable, as needed for passing it
+    to pystencils kernels, which hence must only read from it.
+    """
+    strides = [0] * len(shape)
+    strides[axis] = array_1d.strides[0]
+    return np.lib.stride_tricks.as_strided(array_1d, shape=shape, strides=strides)
+
+
+def get_pyst_cpu_vectorize_info(
+    real_t: Type, fixed_grid_size=False, ghost_layers=1, cpu_blocking=None
+):
+    """Returns the pystencils explicit vectorization options.
+
+    Explicit SIMD intrinsics are emitted only for kernels generated
+    with a fixed grid size, since the field strides are then known
+    at generation time. The widest instruction set supported by the
+    host is used (e.g. avx512), and if the host instruction sets
+    cannot be queried we fall back to compiler autovectorization.
+    Loads and stores are kept unaligned, since the first inner cell
+    of stencil kernels (after the ghost zone) is in general not
+    aligned to the SIMD width, and a scalar tail loop is generated
+    since our fields carry no line padding.
+    Nontemporal (streaming) stores are disabled: pystencils emits them
+    only for aligned accesses, and our kernels update fields in place
+    (e.g. vorticity += ...), so the written cache lines have already been
+    read and streaming them would not save any write-allocate traffic.
+    cpu_blocking: block sizes of the kernel (if blocked), needed since
+    blocking along x also shortens the inner loop.
+    """
+    if not fixed_grid_size:
+        return None
+    supported_instruction_sets = get_supported_instruction_sets()
+    if not supported_instruction_sets:
+        return None
+    # pick the widest (i.e. last listed) instruction set of fixed vector
+    # width, which skips sizeless ones (e.g. sve, whose width is symbolic)
+    for instruction_set in reversed(supported_instruction_sets):
+        if not instruction_set:
+            continue
+        vector_width = get_vector_instruction_set(
+            "float" if real_t == np.float32 else "double", instruction_set
+        )["width"]
+        if isinstance(vector_width, int):
+            break
+    else:
+        return None
+    # pystencils cannot split off the tail of inner loops shorter
+    # than the vector width, hence skip vectorization for such grids
+    # (or x block sizes)
+    if fixed_grid_size[-1] - 2 * ghost_layers < vector_width:
+        return None
+    if cpu_blocking and 0 < cpu_blocking[-1] < vector_width:
+        return None
+    return {
+        "instruction_set": instruction_set,
+        "assume_aligned": False,
+        "nontemporal": False,
+        "assume_sufficient_line_padding": False,
+    }
+
+
+def create_pyst_kernel_with_omp_schedule(
+    stencil, kernel_config: ps.CreateKernelConfig, omp_schedule: str = "static"
+):
+    """Returns the pystencils kernel AST of stencil, with the outer
+    loop(s) parallelised using the given OpenMP schedule (e.g. "static,1").
+
+    pystencils always parallelises with schedule(static), hence the kernel
+    is created serial and the OpenMP pragmas (with the same collapse over
+    cache blocks as pystencils) are added here.
+    """
+    num_threads = kernel_config.cpu_openmp
+    kernel_ast = ps.create_kernel(
+        stencil, config=dataclasses.replace(kernel_config, cpu_openmp=False)
+    )
+    if num_threads:
+        cpu_blocking = kernel_config.cpu_blocking
+        num_blocked_dims = (
+            sum(1 for block_size in cpu_blocking if block_size) if cpu_blocking else 0
+        )
+        add_openmp(
+            kernel_ast,
+            schedule=omp_schedule,
+            num_threads=num_threads,
+            collapse=num_blocked_dims if num_blocked_dims else None,
+        )
+    return kernel_ast
+
+
+def cache_pyst_kernel_generator(kernel_generator: Callable) -> Callable:
+    """Caches kernels returned by a pystencils kernel generator.
+
+    Generating a kernel (sympy codegen + compilation) is expensive, and
+    solvers often regenerate identical kernels, hence the generated kernel
+    is reused for repeated calls with the same (hashable) arguments.
+    Calls with unhashable arguments (e.g. arrays) bypass the cache.
+    The compiled objects themselves are additionally cached on disk
+    across processes by pystencils.
+    Only meant for generators whose kernels hold no mutable state.
+    """
+    # typed, since e.g. num_threads=True (all cores) and num_threads=1
+    # compare (and hash) equal, but generate different kernels
+    cached_kernel_generator = functools.lru_cache(maxsize=None, typed=True)(
+        kernel_generator
+    )
+
+    @functools.wraps(kernel_generator)
+    def kernel_generator_with_cache(*args, **kwargs):
+        try:
+            hash((args, tuple(kwargs.items())))
+        except TypeError:
+            return kernel_generator(*args, **kwargs)
+        return cached_kernel_generator(*args, **kwargs)
+
+    kernel_generator_with_cache.cache_clear = cached_kernel_generator.cache_clear
+    kernel_generator_with_cache.cache_info = cached_kernel_generator.cache_info
+    return kernel_generator_with_cache
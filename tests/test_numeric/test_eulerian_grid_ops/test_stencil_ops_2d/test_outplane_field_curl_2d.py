@@ -36,7 +36,8 @@ class OutplaneCurlSolution:
 @pytest.mark.parametrize("precision", ["single", "double"])
 @pytest.mark.parametrize("n_values", [16])
 @pytest.mark.parametrize("reset_ghost_zone", [True, False])
-def test_outplane_field_curl(n_values, precision, reset_ghost_zone):
+@pytest.mark.parametrize("backend", ["pystencils", "numba"])
+def test_outplane_field_curl(n_values, precision, reset_ghost_zone, backend):
     real_t = get_real_t(precision)
     solution = OutplaneCurlSolution(n_values, precision)
     curl = (
@@ -49,6 +50,7 @@ def test_outplane_field_curl(n_values, precision, reset_ghost_zone):
         fixed_grid_size=(n_values, n_values),
         num_threads=psutil.cpu_count(logical=False),
         reset_ghost_zone=reset_ghost_zone,
+        backend=backend,
     )
     outplane_field_curl_pyst_kernel(
         curl=curl,
@@ -56,3 +58,20 @@ def test_outplane_field_curl(n_values, precision, reset_ghost_zone):
         prefactor=solution.prefactor,
     )
     solution.check_equals(curl)
+
+
+@pytest.mark.parametrize("backend", ["pystencils", "numba"])
+@pytest.mark.parametrize("fixed_grid_size", [False, (16, 16)])
+def test_outplane_field_curl_wrong_shape(backend, fixed_grid_size):
+    real_t = get_real_t("double")
+    outplane_field_curl_pyst_kernel = gen_outplane_field_curl_pyst_kernel_2d(
+        real_t=real_t,
+        fixed_grid_size=fixed_grid_size,
+        reset_ghost_zone=False,
+        backend=backend,
+    )
+    curl = np.zeros((2, 16, 16), dtype=real_t)
+    field = np.zeros((64, 64), dtype=real_t)
+    # pystencils raises TypeError for variable and ValueError for fixed shapes
+    with pytest.raises(ValueError if fixed_grid_size else TypeError):
+        outplane_field_curl_pyst_kernel(curl=curl, field=field, prefactor=real_t(0.1))
@@ -155,3 +155,28 @@ def test_penalise_vector_field_boundary_3d(n_values, precision):
     )
     penalise_field_towards_boundary_pyst_kernel(vector_field=vector_field)
     solution.check_vector_field_equals(vector_field)
+
+
+@pytest.mark.parametrize("precision", ["single", "double"])
+@pytest.mark.parametrize("n_values", [8])
+def test_penalise_field_boundary_3d_unit_width(n_values, precision):
+    real_t = get_real_t(precision)
+    solution = PenaliseFieldBoundarySolution(n_values, precision)
+    field = solution.ref_field.copy()
+    penalise_field_towards_boundary_pyst_kernel = (
+        gen_penalise_field_boundary_pyst_kernel_3d(
+            width=1,
+            dx=solution.dx,
+            x_grid_field=solution.x_grid_field,
+            y_grid_field=solution.y_grid_field,
+            z_grid_field=solution.z_grid_field,
+            real_t=real_t,
+            fixed_grid_size=(n_values, n_values, n_values),
+            num_threads=psutil.cpu_count(logical=False),
+        )
+    )
+    penalise_field_towards_boundary_pyst_kernel(field=field)
+    # unit width zone only zeros the outermost layer of the field
+    ref_penalised_field = np.zeros_like(solution.ref_field)
+    ref_penalised_field[1:-1, 1:-1, 1:-1] = solution.ref_field[1:-1, 1:-1, 1:-1]
+    np.testing.assert_allclose(ref_penalised_field, field, atol=solution.test_tol)
@@ -81,7 +81,8 @@ class UpdateVorticityFromVelocityForcingSolution:
 
 @pytest.mark.parametrize("precision", ["single", "double"])
 @pytest.mark.parametrize("n_values", [16])
-def test_update_vorticity_from_velocity_forcing_3d(n_values, precision):
+@pytest.mark.parametrize("backend", ["pystencils", "numba"])
+def test_update_vorticity_from_velocity_forcing_3d(n_values, precision, backend):
     real_t = get_real_t(precision)
     solution = UpdateVorticityFromVelocityForcingSolution(n_values, precision)
     vorticity_field = solution.ref_vorticity_field.copy()
@@ -90,6 +91,7 @@ def test_update_vorticity_from_velocity_forcing_3d(n_values, precision):
             real_t=real_t,
             fixed_grid_size=(n_values, n_values, n_values),
             num_threads=psutil.cpu_count(logical=False),
+            backend=backend,
         )
     )
     update_vorticity_from_velocity_forcing_pyst_kernel(
@@ -100,6 +102,68 @@ def test_update_vorticity_from_velocity_forcing_3d(n_values, precision):
     solution.check_equals(vorticity_field)
 
 
+@pytest.mark.parametrize("precision", ["single", "double"])
+@pytest.mark.parametrize("n_values", [16])
+def test_update_vorticity_from_velocity_forcing_3d_component_layout(
+    n_values, precision
+):
+    real_t = get_real_t(precision)
+    solution = UpdateVorticityFromVelocityForcingSolution(n_values, precision)
+    # separately allocated components
+    vorticity_field_x, vorticity_field_y, vorticity_field_z = (
+        solution.ref_vorticity_field[i].copy() for i in range(3)
+    )
+    velocity_forcing_field_x, velocity_forcing_field_y, velocity_forcing_field_z = (
+        solution.ref_velocity_forcing_field[i].copy() for i in range(3)
+    )
+    update_vorticity_from_velocity_forcing_pyst_kernel = (
+        gen_update_vorticity_from_velocity_forcing_pyst_kernel_3d(
+            real_t=real_t,
+            fixed_grid_size=(n_values, n_values, n_values),
+            num_threads=psutil.cpu_count(logical=False),
+            field_layout="component",
+        )
+    )
+    update_vorticity_from_velocity_forcing_pyst_kernel(
+        vorticity_field_x=vorticity_field_x,
+        vorticity_field_y=vorticity_field_y,
+        vorticity_field_z=vorticity_field_z,
+        velocity_forcing_field_x=velocity_forcing_field_x,
+        velocity_forcing_field_y=velocity_forcing_field_y,
+        velocity_forcing_field_z=velocity_forcing_field_z,
+        prefactor=solution.prefactor,
+    )
+    solution.check_equals(
+        np.stack((vorticity_field_x, vorticity_field_y, vorticity_field_z))
+    )
+
+
+@pytest.mark.parametrize("precision", ["single", "double"])
+@pytest.mark.parametrize("n_values", [16])
+def test_update_vorticity_from_velocity_forcing_3d_gpu(n_values, precision):
+    gpuarray = pytest.importorskip("pycuda.gpuarray")
+    try:
+        import pycuda.autoinit  # noqa: F401
+    except Exception:
+        pytest.skip("No CUDA device available")
+    real_t = get_real_t(precision)
+    solution = UpdateVorticityFromVelocityForcingSolution(n_values, precision)
+    vorticity_field = gpuarray.to_gpu(solution.ref_vorticity_field)
+    update_vorticity_from_velocity_forcing_pyst_kernel = (
+        gen_update_vorticity_from_velocity_forcing_pyst_kernel_3d(
+            real_t=real_t,
+            fixed_grid_size=(n_values, n_values, n_values),
+            target="gpu",
+        )
+    )
+    update_vorticity_from_velocity_forcing_pyst_kernel(
+        vorticity_field=vorticity_field,
+        velocity_forcing_field=gpuarray.to_gpu(solution.ref_velocity_forcing_field),
+        prefactor=solution.prefactor,
+    )
+    solution.check_equals(vorticity_field.get())
+
+
 @pytest.mark.parametrize("precision", ["single", "double"])
 @pytest.mark.parametrize("n_values", [16])
 def test_update_vorticity_from_penalised_velocity_3d(n_values, precision):
@@ -133,3 +197,82 @@ def test_update_vorticity_from_penalised_velocity_3d(n_values, precision):
         vorticity_field[..., 1:-1, 1:-1, 1:-1],
         atol=get_test_tol(precision),
     )
+
+
+def get_host_cpu_flags():
+    try:
+        with open("/proc/cpuinfo") as cpuinfo:
+            for line in cpuinfo:
+                if line.startswith("flags"):
+                    return set(line.split(":")[1].split())
+    except OSError:
+        pass
+    return set()
+
+
+@pytest.mark.parametrize("precision", ["single", "double"])
+@pytest.mark.parametrize(
+    "instruction_set, cpu_flag", [("avx", "avx2"), ("avx512", "avx512f")]
+)
+@pytest.mark.parametrize("cache_blocking", [(16, 16, 0), (4, 8, 8), (0, 0, 8)])
+def test_update_vorticity_from_velocity_forcing_3d_explicit_simd(
+    precision, instruction_set, cpu_flag, cache_blocking, monkeypatch
+):
+    # pystencils queries the host instruction sets via (optional) cpuinfo,
+    # hence force them here to exercise the explicit SIMD kernels
+    if cpu_flag not in get_host_cpu_flags():
+        pytest.skip(f"Host does not support {instruction_set}")
+    monkeypatch.setenv("PYSTENCILS_SIMD", f"sse,{instruction_set}")
+    gen_update_vorticity_from_velocity_forcing_pyst_kernel_3d.cache_clear()
+    real_t = get_real_t(precision)
+    grid_size = (9, 37, 18)
+    vorticity_field = np.random.rand(3, *grid_size).astype(real_t)
+    velocity_forcing_field = np.random.rand(3, *grid_size).astype(real_t)
+    prefactor = real_t(0.1)
+    ref_vorticity_field = update_vorticity_from_velocity_forcing_reference_3d(
+        vorticity_field, velocity_forcing_field, prefactor
+    )
+    update_vorticity_from_velocity_forcing_pyst_kernel = (
+        gen_update_vorticity_from_velocity_forcing_pyst_kernel_3d(
+            real_t=real_t,
+            fixed_grid_size=grid_size,
+            num_threads=psutil.cpu_count(logical=False),
+            cache_blocking=cache_blocking,
+        )
+    )
+    gen_update_vorticity_from_velocity_forcing_pyst_kernel_3d.cache_clear()
+    update_vorticity_from_velocity_forcing_pyst_kernel(
+        vorticity_field=vorticity_field,
+        velocity_forcing_field=velocity_forcing_field,
+        prefactor=prefactor,
+    )
+    inner_idx = (slice(None),) + (slice(1, -1),) * 3
+    np.testing.assert_allclose(
+        ref_vorticity_field[inner_idx],
+        vorticity_field[inner_idx],
+        atol=get_test_tol(precision),
+    )
+
+
+@pytest.mark.parametrize("backend", ["pystencils", "numba"])
+@pytest.mark.parametrize("fixed_grid_size", [False, (8, 8, 8)])
+def test_update_vorticity_from_velocity_forcing_3d_wrong_shape(
+    backend, fixed_grid_size
+):
+    real_t = get_real_t("double")
+    update_vorticity_from_velocity_forcing_pyst_kernel = (
+        gen_update_vorticity_from_velocity_forcing_pyst_kernel_3d(
+            real_t=real_t,
+            fixed_grid_size=fixed_grid_size,
+            backend=backend,
+        )
+    )
+    vorticity_field = np.zeros((3, 8, 8, 8), dtype=real_t)
+    velocity_forcing_field = np.zeros((3, 16, 16, 16), dtype=real_t)
+    # pystencils raises TypeError for variable and ValueError for fixed shapes
+    with pytest.raises(ValueError if fixed_grid_size else TypeError):
+        update_vorticity_from_velocity_forcing_pyst_kernel(
+            vorticity_field=vorticity_field,
+            velocity_forcing_field=velocity_forcing_field,
+            prefactor=real_t(0.1),
+        )
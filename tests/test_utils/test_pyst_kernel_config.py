@@ -0,0 +1,65 @@
+import numpy as np
+
+import pytest
+
+from sopht.utils.pyst_kernel_config import (
+    cache_pyst_kernel_generator,
+    get_pyst_broadcast_view,
+    get_pyst_cpu_vectorize_info,
+)
+
+
+def test_cache_pyst_kernel_generator():
+    num_generator_calls = 0
+
+    @cache_pyst_kernel_generator
+    def gen_dummy_kernel(real_t, num_threads=False, fixed_grid_size=False):
+        nonlocal num_generator_calls
+        num_generator_calls += 1
+
+        def dummy_kernel(field):
+            pass
+
+        return dummy_kernel
+
+    kernel = gen_dummy_kernel(np.float32, fixed_grid_size=(16, 16))
+    assert gen_dummy_kernel(np.float32, fixed_grid_size=(16, 16)) is kernel
+    assert num_generator_calls == 1
+    assert gen_dummy_kernel(np.float64, fixed_grid_size=(16, 16)) is not kernel
+    assert num_generator_calls == 2
+    # num_threads=True (all cores) and num_threads=1 are different kernels
+    kernel = gen_dummy_kernel(np.float32, num_threads=True)
+    assert gen_dummy_kernel(np.float32, num_threads=1) is not kernel
+    assert num_generator_calls == 4
+    # unhashable arguments bypass the cache
+    gen_dummy_kernel(np.float32, fixed_grid_size=[16, 16])
+    gen_dummy_kernel(np.float32, fixed_grid_size=[16, 16])
+    assert num_generator_calls == 6
+
+
+def test_get_pyst_broadcast_view():
+    array_1d = np.arange(4, dtype=np.float64)
+    broadcast_view = get_pyst_broadcast_view(array_1d, shape=(3, 4, 5), axis=1)
+    np.testing.assert_equal(
+        broadcast_view, np.broadcast_to(array_1d[:, np.newaxis], (3, 4, 5))
+    )
+    assert broadcast_view.flags.writeable
+    assert np.shares_memory(broadcast_view, array_1d)
+
+
+@pytest.mark.parametrize(
+    "instruction_sets, expected_instruction_set",
+    [("sse,avx", "avx"), ("neon,sve", "neon"), ("sve", None)],
+)
+def test_get_pyst_cpu_vectorize_info_instruction_set(
+    instruction_sets, expected_instruction_set, monkeypatch
+):
+    # sizeless instruction sets (e.g. sve) are skipped
+    monkeypatch.setenv("PYSTENCILS_SIMD", instruction_sets)
+    cpu_vectorize_info = get_pyst_cpu_vectorize_info(
+        np.float64, fixed_grid_size=(32, 32, 32)
+    )
+    if expected_instruction_set is None:
+        assert cpu_vectorize_info is None
+    else:
+        assert cpu_vectorize_info["instruction_set"] == expected_instruction_set